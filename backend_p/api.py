@@ -5,16 +5,42 @@ Exposes endpoints for browsing mangas, serving comic pages,
 managing sources, and tracking reading progress.
 """
 
+import asyncio
+import itertools
 import mimetypes
+import multiprocessing
 import os
-from typing import Optional
-
-from fastapi import FastAPI, HTTPException, Query
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Any, Optional
+
+import orjson
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
+from fastapi.responses import (
+    FileResponse,
+    ORJSONResponse,
+    Response,
+    StreamingResponse,
+)
 from pydantic import BaseModel
 
-from comic_parser import get_page_count, get_page_image, get_page_thumbnail
+from comic_parser import (
+    extract_cbz_page_stream,
+    get_cached_cbz_page,
+    get_cbz_page_name,
+    get_folder_page_path,
+    get_page_count,
+    get_page_thumbnail,
+    guess_image_mime,
+    is_cbz_file,
+    thumbnail_cache_path,
+    thumbnail_etag,
+    warm_cbz_page,
+)
 from database import DatabaseManager
 from scanner import scan_source
 
@@ -39,14 +65,80 @@ class ProgressUpdate(BaseModel):
     total_pages: int = 0
 
 
+# ---------------------------------------------------------------------------
+# JSON responses
+# ---------------------------------------------------------------------------
+
+def _orjson_default(obj: Any) -> Any:
+    """Serialize types orjson doesn't know natively."""
+    if isinstance(obj, sqlite3.Row):
+        return dict(obj)
+    raise TypeError
+
+
+class RowJSONResponse(ORJSONResponse):
+    """ORJSONResponse that also accepts ``sqlite3.Row`` objects."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            default=_orjson_default,
+            option=orjson.OPT_NON_STR_KEYS,
+        )
+
+
 # ---------------------------------------------------------------------------
 # App initialization
 # ---------------------------------------------------------------------------
 
+# Thumbnail rendering is CPU-bound: run it on one worker process per core
+# and cap in-flight jobs so a cover grid can't queue unbounded work.
+THUMBNAIL_WORKERS = os.cpu_count() or 1
+THUMBNAIL_MAX_IN_FLIGHT = THUMBNAIL_WORKERS * 2
+
+# Thumbnail URLs aren't content-addressed, so let clients keep them but
+# revalidate with the ETag (a cheap 304) before each reuse.
+THUMBNAIL_CACHE_CONTROL = "public, no-cache"
+
+
+# Thumbnail workers must not be fork()ed from this threaded process: a
+# child could inherit a lock (zip pool, page cache, sqlite) held by some
+# other thread at that instant and deadlock for good.  forkserver forks
+# from a clean single-threaded server; spawn where it doesn't exist
+# (Windows).
+THUMBNAIL_MP_CONTEXT = multiprocessing.get_context(
+    "forkserver"
+    if "forkserver" in multiprocessing.get_all_start_methods()
+    else "spawn"
+)
+
+
+def _new_thumb_pool() -> ProcessPoolExecutor:
+    """Create a thumbnail worker pool."""
+    return ProcessPoolExecutor(
+        max_workers=THUMBNAIL_WORKERS, mp_context=THUMBNAIL_MP_CONTEXT
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start the thumbnail worker pool; on exit stop it and close the DB."""
+    app.state.thumb_pool = _new_thumb_pool()
+    # Created here, not at import, so it binds to the server's event loop
+    app.state.thumb_semaphore = asyncio.Semaphore(THUMBNAIL_MAX_IN_FLIGHT)
+    try:
+        yield
+    finally:
+        app.state.thumb_pool.shutdown(cancel_futures=True)
+        db.close()
+
+
 app = FastAPI(
     title="Comic Viewer API",
     description="Backend API for browsing and reading comics / manga.",
     version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=RowJSONResponse,
 )
 
 # Allow the iOS app (and local dev) to call the API
@@ -62,37 +154,83 @@ app.add_middleware(
 db = DatabaseManager()
 
 
+async def _render_thumbnail(
+    chapter_path: str, page_number: int, etag: Optional[str] = None
+) -> Optional[bytes]:
+    """
+    Generate a page thumbnail in the worker pool without blocking.
+
+    A worker that dies (OOM kill, crash in a decoder) breaks the whole
+    pool for good, so a broken pool is replaced and the job retried once.
+    """
+    render = partial(get_page_thumbnail, chapter_path, page_number, etag=etag)
+    async with app.state.thumb_semaphore:
+        loop = asyncio.get_running_loop()
+        pool = app.state.thumb_pool
+        try:
+            return await loop.run_in_executor(pool, render)
+        except BrokenProcessPool:
+            # Concurrent requests see the same broken pool: only the
+            # first one swaps it out.
+            if app.state.thumb_pool is pool:
+                app.state.thumb_pool = _new_thumb_pool()
+                pool.shutdown(wait=False, cancel_futures=True)
+            return await loop.run_in_executor(app.state.thumb_pool, render)
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """Check whether the request's ``If-None-Match`` covers *etag*."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+    return "*" in tags or f'"{etag}"' in tags
+
+
+# Endpoints returning row lists wrap them in RowJSONResponse themselves:
+# a plain return value would first be walked by jsonable_encoder in
+# Python, which costs more than orjson's whole C serialization.
+#
+# Endpoints are ``async def`` and push every blocking sqlite3 / zipfile /
+# filesystem call onto a worker thread with ``asyncio.to_thread``, so
+# requests interleave at each await instead of holding a threadpool
+# slot for their whole duration.
+
+
 # ---------------------------------------------------------------------------
 # Sources
 # ---------------------------------------------------------------------------
 
 @app.get("/api/sources")
-def list_sources():
+async def list_sources():
     """Return all registered comic sources."""
-    return db.get_sources()
+    return RowJSONResponse(await asyncio.to_thread(db.get_sources))
 
 
 @app.post("/api/sources", status_code=201)
-def create_source(body: SourceCreate):
+async def create_source(body: SourceCreate):
     """Register a new comic source directory."""
-    if not os.path.isdir(body.path):
+    if not await asyncio.to_thread(os.path.isdir, body.path):
         raise HTTPException(
             status_code=400,
             detail=f"Directory does not exist: {body.path}",
         )
-    source_id = db.add_source(
-        name=body.name, path=body.path, source_type=body.source_type
+    source_id = await asyncio.to_thread(
+        db.add_source,
+        name=body.name, path=body.path, source_type=body.source_type,
     )
     return {"id": source_id, "message": "Source created."}
 
 
 @app.post("/api/sources/{source_id}/scan")
-def scan_source_endpoint(source_id: int):
+async def scan_source_endpoint(source_id: int):
     """Trigger a scan of a source directory to discover mangas."""
-    source = db.get_source(source_id)
+    source = await asyncio.to_thread(db.get_source, source_id)
     if source is None:
         raise HTTPException(status_code=404, detail="Source not found.")
-    result = scan_source(db, source_id, source["path"])
+    result = await asyncio.to_thread(
+        scan_source, db, source_id, source["path"]
+    )
     return {
         "message": "Scan complete.",
         "mangas_found": result["mangas"],
@@ -101,12 +239,12 @@ def scan_source_endpoint(source_id: int):
 
 
 @app.delete("/api/sources/{source_id}")
-def delete_source(source_id: int):
+async def delete_source(source_id: int):
     """Delete a source and all its mangas/chapters (cascade)."""
-    source = db.get_source(source_id)
+    source = await asyncio.to_thread(db.get_source, source_id)
     if source is None:
         raise HTTPException(status_code=404, detail="Source not found.")
-    db.delete_source(source_id)
+    await asyncio.to_thread(db.delete_source, source_id)
     return {"message": "Source deleted."}
 
 
@@ -115,7 +253,7 @@ def delete_source(source_id: int):
 # ---------------------------------------------------------------------------
 
 @app.get("/api/mangas")
-def list_mangas(source_id: Optional[int] = Query(None)):
+async def list_mangas(source_id: Optional[int] = Query(None)):
     """
     Return all mangas, optionally filtered by source.
 
@@ -123,27 +261,28 @@ def list_mangas(source_id: Optional[int] = Query(None)):
         source_id – If provided, return only mangas from that source.
     """
     if source_id is not None:
-        return db.get_mangas_by_source(source_id)
-    return db.get_mangas()
+        mangas = await asyncio.to_thread(db.get_mangas_by_source, source_id)
+    else:
+        mangas = await asyncio.to_thread(db.get_mangas)
+    return RowJSONResponse(mangas)
 
 
 @app.get("/api/mangas/{manga_id}")
-def get_manga(manga_id: int):
+async def get_manga(manga_id: int):
     """Return a single manga with its chapter list."""
-    manga = db.get_manga(manga_id)
+    manga = await asyncio.to_thread(db.get_manga_with_chapters, manga_id)
     if manga is None:
         raise HTTPException(status_code=404, detail="Manga not found.")
-    chapters = db.get_chapters(manga_id)
-    return {**manga, "chapters": chapters}
+    return RowJSONResponse(manga)
 
 
 @app.delete("/api/mangas/{manga_id}")
-def delete_manga(manga_id: int):
+async def delete_manga(manga_id: int):
     """Delete a manga and all its chapters (cascade)."""
-    manga = db.get_manga(manga_id)
+    manga = await asyncio.to_thread(db.get_manga, manga_id)
     if manga is None:
         raise HTTPException(status_code=404, detail="Manga not found.")
-    db.delete_manga(manga_id)
+    await asyncio.to_thread(db.delete_manga, manga_id)
     return {"message": "Manga deleted."}
 
 
@@ -151,68 +290,132 @@ def delete_manga(manga_id: int):
 # Chapters & Pages
 # ---------------------------------------------------------------------------
 
-@app.get("/api/chapters/{chapter_id}")
-def get_chapter(chapter_id: int):
-    """Return chapter details including page count."""
-    chapter = db.get_chapter(chapter_id)
+async def _require_chapter(chapter_id: int) -> dict:
+    """Fetch a chapter or raise a 404."""
+    chapter = await asyncio.to_thread(db.get_chapter, chapter_id)
     if chapter is None:
         raise HTTPException(status_code=404, detail="Chapter not found.")
-    page_count = get_page_count(chapter["file_path"])
+    return chapter
+
+
+def _cbz_page_name(chapter_path: str, page_number: int) -> Optional[str]:
+    """Resolve a page of an archive chapter, or None if not an archive."""
+    if not is_cbz_file(chapter_path):
+        return None
+    return get_cbz_page_name(chapter_path, page_number)
+
+
+@app.get("/api/chapters/{chapter_id}")
+async def get_chapter(chapter_id: int):
+    """Return chapter details including page count."""
+    chapter = await _require_chapter(chapter_id)
+    page_count = await asyncio.to_thread(get_page_count, chapter["file_path"])
     return {**chapter, "page_count": page_count}
 
 
 @app.get("/api/chapters/{chapter_id}/pages")
-def list_pages(chapter_id: int):
-    """Return metadata about all pages in a chapter."""
-    chapter = db.get_chapter(chapter_id)
-    if chapter is None:
-        raise HTTPException(status_code=404, detail="Chapter not found.")
-    page_count = get_page_count(chapter["file_path"])
-    return {
+async def list_pages(chapter_id: int):
+    """
+    Return metadata about all pages in a chapter.
+
+    ``url_template`` lets clients build page URLs from ``page_count``
+    alone; the per-page ``pages`` list is kept for older clients.
+    """
+    chapter = await _require_chapter(chapter_id)
+    page_count = await asyncio.to_thread(get_page_count, chapter["file_path"])
+    prefix = f"/api/chapters/{chapter_id}/pages/"
+    return RowJSONResponse({
         "chapter_id": chapter_id,
         "page_count": page_count,
+        "url_template": prefix + "{page}",
         "pages": [
-            {"page_number": i, "url": f"/api/chapters/{chapter_id}/pages/{i}"}
+            {"page_number": i, "url": prefix + str(i)}
             for i in range(page_count)
         ],
-    }
+    })
 
 
 @app.get("/api/chapters/{chapter_id}/pages/{page_number}")
-def get_page(chapter_id: int, page_number: int):
-    """Serve a single page image from a chapter."""
-    chapter = db.get_chapter(chapter_id)
-    if chapter is None:
-        raise HTTPException(status_code=404, detail="Chapter not found.")
+async def get_page(
+    chapter_id: int, page_number: int, background_tasks: BackgroundTasks
+):
+    """
+    Serve a single page image from a chapter.
+
+    For archives the next page is decompressed in the background once
+    this response is sent, so sequential reading hits the cache.
+    """
+    chapter = await _require_chapter(chapter_id)
+    chapter_path = chapter["file_path"]
 
-    image_data = get_page_image(chapter["file_path"], page_number)
-    if image_data is None:
+    # Image folders: let the server sendfile() the page straight from disk
+    if await asyncio.to_thread(os.path.isdir, chapter_path):
+        page_path = await asyncio.to_thread(
+            get_folder_page_path, chapter_path, page_number
+        )
+        if page_path is None:
+            raise HTTPException(status_code=404, detail="Page not found.")
+        mime, _ = mimetypes.guess_type(page_path)
+        return FileResponse(page_path, media_type=mime or "image/jpeg")
+
+    # Archives: stream the entry so large pages never sit in memory whole
+    page_name = await asyncio.to_thread(
+        _cbz_page_name, chapter_path, page_number
+    )
+    if page_name is None:
         raise HTTPException(status_code=404, detail="Page not found.")
+    background_tasks.add_task(warm_cbz_page, chapter_path, page_number + 1)
 
-    # Detect content type from the first bytes
-    content_type = "image/jpeg"
-    if image_data[:8] == b"\x89PNG\r\n\x1a\n":
-        content_type = "image/png"
-    elif image_data[:4] == b"RIFF" and image_data[8:12] == b"WEBP":
-        content_type = "image/webp"
-    elif image_data[:3] == b"GIF":
-        content_type = "image/gif"
+    cached = await asyncio.to_thread(
+        get_cached_cbz_page, chapter_path, page_name
+    )
+    if cached is not None:
+        return Response(content=cached, media_type=guess_image_mime(cached))
 
-    return Response(content=image_data, media_type=content_type)
+    stream = extract_cbz_page_stream(chapter_path, page_name)
+    head = await asyncio.to_thread(next, stream, b"")
+    return StreamingResponse(
+        itertools.chain((head,), stream), media_type=guess_image_mime(head)
+    )
 
 
 @app.get("/api/chapters/{chapter_id}/pages/{page_number}/thumbnail")
-def get_thumbnail(chapter_id: int, page_number: int):
-    """Serve a thumbnail version of a page image."""
-    chapter = db.get_chapter(chapter_id)
-    if chapter is None:
-        raise HTTPException(status_code=404, detail="Chapter not found.")
+async def get_thumbnail(chapter_id: int, page_number: int, request: Request):
+    """
+    Serve a thumbnail version of a page image.
+
+    Responses carry an ``ETag``; a matching ``If-None-Match`` gets a
+    304 without touching the image.  Thumbnails rendered before are
+    sent straight from the on-disk cache.
+    """
+    chapter = await _require_chapter(chapter_id)
 
-    thumb_data = get_page_thumbnail(chapter["file_path"], page_number)
+    etag = await asyncio.to_thread(
+        thumbnail_etag, chapter["file_path"], page_number
+    )
+    if etag is None:
+        raise HTTPException(status_code=404, detail="Page not found.")
+    headers = {"ETag": f'"{etag}"', "Cache-Control": THUMBNAIL_CACHE_CONTROL}
+
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    # Already rendered: sendfile() it, skipping the worker pool
+    cache_path = thumbnail_cache_path(etag)
+    if await asyncio.to_thread(os.path.isfile, cache_path):
+        return FileResponse(
+            cache_path, media_type="image/jpeg", headers=headers
+        )
+
+    thumb_data = await _render_thumbnail(
+        chapter["file_path"], page_number, etag
+    )
     if thumb_data is None:
         raise HTTPException(status_code=404, detail="Page not found.")
 
-    return Response(content=thumb_data, media_type="image/jpeg")
+    return Response(
+        content=thumb_data, media_type="image/jpeg", headers=headers
+    )
 
 
 # ---------------------------------------------------------------------------
@@ -220,25 +423,23 @@ def get_thumbnail(chapter_id: int, page_number: int):
 # ---------------------------------------------------------------------------
 
 @app.get("/api/mangas/{manga_id}/cover")
-def get_cover(manga_id: int):
+async def get_cover(manga_id: int):
     """Serve the cover image for a manga."""
-    manga = db.get_manga(manga_id)
+    manga = await asyncio.to_thread(db.get_manga, manga_id)
     if manga is None:
         raise HTTPException(status_code=404, detail="Manga not found.")
 
     cover_path = manga.get("cover_path", "")
 
     # If a cover file exists on disk, serve it
-    if cover_path and os.path.isfile(cover_path):
-        with open(cover_path, "rb") as f:
-            data = f.read()
+    if cover_path and await asyncio.to_thread(os.path.isfile, cover_path):
         mime, _ = mimetypes.guess_type(cover_path)
-        return Response(content=data, media_type=mime or "image/jpeg")
+        return FileResponse(cover_path, media_type=mime or "image/jpeg")
 
     # Fallback: first page of the first chapter
-    chapters = db.get_chapters(manga_id)
+    chapters = await asyncio.to_thread(db.get_chapters, manga_id)
     if chapters:
-        thumb = get_page_thumbnail(chapters[0]["file_path"], 0)
+        thumb = await _render_thumbnail(chapters[0]["file_path"], 0)
         if thumb:
             return Response(content=thumb, media_type="image/jpeg")
 
@@ -250,15 +451,15 @@ def get_cover(manga_id: int):
 # ---------------------------------------------------------------------------
 
 @app.get("/api/progress")
-def list_progress():
+async def list_progress():
     """Return all reading progress records."""
-    return db.get_all_progress()
+    return RowJSONResponse(await asyncio.to_thread(db.get_all_progress))
 
 
 @app.get("/api/progress/{manga_id}")
-def get_progress(manga_id: int):
+async def get_progress(manga_id: int):
     """Return reading progress for a specific manga."""
-    progress = db.get_progress(manga_id)
+    progress = await asyncio.to_thread(db.get_progress, manga_id)
     if progress is None:
         return {
             "manga_id": manga_id,
@@ -271,28 +472,32 @@ def get_progress(manga_id: int):
 
 
 @app.put("/api/progress/{manga_id}")
-def update_progress(manga_id: int, body: ProgressUpdate):
-    """Create or update reading progress for a manga."""
-    manga = db.get_manga(manga_id)
-    if manga is None:
-        raise HTTPException(status_code=404, detail="Manga not found.")
-    chapter = db.get_chapter(body.chapter_id)
-    if chapter is None:
-        raise HTTPException(status_code=404, detail="Chapter not found.")
+async def update_progress(manga_id: int, body: ProgressUpdate):
+    """
+    Create or update reading progress for a manga.
 
-    db.upsert_progress(
-        manga_id=manga_id,
-        chapter_id=body.chapter_id,
-        current_page=body.current_page,
-        total_pages=body.total_pages,
-    )
+    Called on every page turn, so existence of the manga and chapter is
+    enforced by the table's foreign keys rather than extra lookups.
+    """
+    try:
+        await asyncio.to_thread(
+            db.upsert_progress,
+            manga_id=manga_id,
+            chapter_id=body.chapter_id,
+            current_page=body.current_page,
+            total_pages=body.total_pages,
+        )
+    except sqlite3.IntegrityError:
+        raise HTTPException(
+            status_code=404, detail="Manga or chapter not found."
+        )
     return {"message": "Progress updated."}
 
 
 @app.delete("/api/progress/{manga_id}")
-def delete_progress(manga_id: int):
+async def delete_progress(manga_id: int):
     """Delete reading progress for a manga."""
-    db.delete_progress(manga_id)
+    await asyncio.to_thread(db.delete_progress, manga_id)
     return {"message": "Progress deleted."}
 
 
@@ -301,6 +506,6 @@ def delete_progress(manga_id: int):
 # ---------------------------------------------------------------------------
 
 @app.get("/api/health")
-def health_check():
+async def health_check():
     """Simple health-check endpoint."""
     return {"status": "ok", "version": app.version}
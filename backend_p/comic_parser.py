@@ -4,17 +4,74 @@ comic_parser.py – Extract and serve images from comic archives and folders.
 Supports CBZ (ZIP), and plain directories of images (JPG, PNG, WEBP, GIF).
 """
 
+import functools
+import hashlib
 import os
+import re
+import shutil
+import stat
 import tempfile
+import threading
+import time
 import zipfile
+from collections import OrderedDict
+from contextlib import contextmanager
 from io import BytesIO
-from typing import Optional
+from typing import Iterator, Optional
 
 from PIL import Image
 
+try:
+    import pyvips
+except (ImportError, OSError):  # not installed, or libvips is missing
+    pyvips = None
+
 
 # Supported image extensions (lowercase, with dot)
-IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp", ".tiff"}
+IMAGE_EXTENSIONS = frozenset(
+    {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp", ".tiff"}
+)
+
+# Archive extensions treated as CBZ (lowercase, with dot)
+CBZ_EXTENSIONS = (".cbz", ".zip")
+
+# Image extensions as a tuple, for a single ``name.lower().endswith()``
+IMAGE_EXT_TUPLE = tuple(sorted(IMAGE_EXTENSIONS))
+
+# Splits names into text and digit runs for natural ordering
+_DIGITS_RE = re.compile(r"(\d+)")
+
+# Leading magic bytes -> MIME type (WEBP is checked separately, its
+# signature is split around the RIFF chunk size)
+_MAGIC = {
+    b"\xff\xd8\xff": "image/jpeg",
+    b"\x89PNG\r\n\x1a\n": "image/png",
+    b"GIF8": "image/gif",
+    b"BM": "image/bmp",
+    b"II*\x00": "image/tiff",
+    b"MM\x00*": "image/tiff",
+}
+
+# Maximum number of archives kept open in the ZipFile handle pool
+ZIP_POOL_SIZE = 32
+
+# Chunk size used when streaming archive members to clients
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Copy buffer used when extracting archive members to disk
+EXTRACT_BUFFER_SIZE = 1024 * 1024
+
+# Prefetched archive pages: total size cap and time-to-live in seconds
+PAGE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+PAGE_CACHE_TTL = 300.0
+
+# Generated thumbnails are cached here: backend_p/thumbnail_cache unless
+# COMICVIEWER_THUMBNAIL_CACHE_DIR is set.  Safe to delete at any time.
+THUMBNAIL_CACHE_DIR = os.environ.get(
+    "COMICVIEWER_THUMBNAIL_CACHE_DIR"
+) or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "thumbnail_cache"
+)
 
 
 def is_image_file(filename: str) -> bool:
@@ -27,8 +84,65 @@ def is_image_file(filename: str) -> bool:
     Returns:
         True if the extension is a supported image type.
     """
-    _, ext = os.path.splitext(filename)
-    return ext.lower() in IMAGE_EXTENSIONS
+    return filename.lower().endswith(IMAGE_EXT_TUPLE)
+
+
+def _natural_key(name: str) -> tuple:
+    """
+    Sort key that orders embedded numbers numerically.
+
+    ``"page9.jpg"`` sorts before ``"page10.jpg"``.  Text runs compare
+    case-insensitively, so distinct names can tie (``"1.jpg"`` and
+    ``"01.jpg"``); callers break ties on the raw name.
+    """
+    parts = _DIGITS_RE.split(name)
+    return tuple(
+        int(part) if i % 2 else part.lower() for i, part in enumerate(parts)
+    )
+
+
+def _file_key(filepath: str) -> Optional[tuple[str, int, int]]:
+    """
+    Build a cache key that changes whenever a file is modified.
+
+    Args:
+        filepath: Path to the file.
+
+    Returns:
+        ``(path, mtime_ns, size)`` for a regular file, or None if the
+        path is missing or not a regular file.
+    """
+    try:
+        st = os.stat(filepath)
+    except OSError:
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        return None
+    return (filepath, st.st_mtime_ns, st.st_size)
+
+
+@functools.lru_cache(maxsize=512)
+def _is_zipfile_cached(key: tuple[str, int, int]) -> bool:
+    """Cached ``zipfile.is_zipfile`` keyed by :func:`_file_key`."""
+    return zipfile.is_zipfile(key[0])
+
+
+def guess_image_mime(data: bytes) -> str:
+    """
+    Detect an image's MIME type from its leading bytes.
+
+    Args:
+        data: Image bytes (only the first 12 are inspected).
+
+    Returns:
+        The detected MIME type, defaulting to ``"image/jpeg"``.
+    """
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    for magic, mime in _MAGIC.items():
+        if data.startswith(magic):
+            return mime
+    return "image/jpeg"
 
 
 def is_cbz_file(filepath: str) -> bool:
@@ -41,34 +155,164 @@ def is_cbz_file(filepath: str) -> bool:
     Returns:
         True if the file exists and is a valid ZIP archive.
     """
-    return (
-        os.path.isfile(filepath)
-        and filepath.lower().endswith((".cbz", ".zip"))
-        and zipfile.is_zipfile(filepath)
-    )
+    if not filepath.lower().endswith(CBZ_EXTENSIONS):
+        return False
+    key = _file_key(filepath)
+    return key is not None and _is_zipfile_cached(key)
+
+
+# ---------------------------------------------------------------------------
+# ZipFile handle pool
+# ---------------------------------------------------------------------------
+
+class _PooledZip:
+    """An open ZipFile in the pool, with the number of current users."""
+
+    __slots__ = ("zf", "mtime_ns", "users", "retired")
+
+    def __init__(self, zf: zipfile.ZipFile, mtime_ns: int) -> None:
+        self.zf = zf
+        self.mtime_ns = mtime_ns
+        self.users = 0
+        self.retired = False
+
+
+# path -> pooled handle, least recently used first
+_ZIP_POOL: "OrderedDict[str, _PooledZip]" = OrderedDict()
+_ZIP_POOL_LOCK = threading.Lock()
+
+
+def _retire_zip(pooled: _PooledZip) -> list[zipfile.ZipFile]:
+    """
+    Mark a handle dropped from the pool (caller holds the pool lock).
+
+    Returns:
+        The ZipFile to close now if nobody is using it, else an empty
+        list; the last user closes it on release.
+    """
+    pooled.retired = True
+    return [pooled.zf] if pooled.users == 0 else []
+
+
+@contextmanager
+def _leased_zip(cbz_path: str) -> Iterator[zipfile.ZipFile]:
+    """
+    Borrow an open ZipFile for *cbz_path* from the pool.
+
+    Handles are reopened when the file's mtime changes, and the least
+    recently used one is dropped once the pool exceeds
+    ``ZIP_POOL_SIZE``.  A dropped handle is only closed after its last
+    user leaves the block, so it is never closed under a reader.
+    ZipFile serializes member reads internally, so one handle can be
+    shared between request threads.
+
+    Archives are opened (and their central directory parsed) outside
+    the pool lock, so cold opens of different files run in parallel.
+
+    Args:
+        cbz_path: Path to the CBZ or ZIP file.
+
+    Yields:
+        An open ``zipfile.ZipFile``.  Callers must not close it.
+
+    Raises:
+        OSError: If the file cannot be opened.
+        zipfile.BadZipFile: If the file is not a valid archive.
+    """
+    mtime_ns = os.stat(cbz_path).st_mtime_ns
+    with _ZIP_POOL_LOCK:
+        pooled = _ZIP_POOL.get(cbz_path)
+        if pooled is not None and pooled.mtime_ns == mtime_ns:
+            _ZIP_POOL.move_to_end(cbz_path)
+            pooled.users += 1
+        else:
+            pooled = None
+
+    if pooled is None:
+        opened = _PooledZip(zipfile.ZipFile(cbz_path, "r"), mtime_ns)
+        to_close: list[zipfile.ZipFile] = []
+        with _ZIP_POOL_LOCK:
+            pooled = _ZIP_POOL.get(cbz_path)
+            if pooled is not None and pooled.mtime_ns == mtime_ns:
+                # Another thread pooled it meanwhile: use theirs
+                to_close.append(opened.zf)
+            else:
+                if pooled is not None:
+                    to_close += _retire_zip(pooled)
+                pooled = _ZIP_POOL[cbz_path] = opened
+                while len(_ZIP_POOL) > ZIP_POOL_SIZE:
+                    _, stale = _ZIP_POOL.popitem(last=False)
+                    to_close += _retire_zip(stale)
+            _ZIP_POOL.move_to_end(cbz_path)
+            pooled.users += 1
+        for zf in to_close:
+            zf.close()
+
+    try:
+        yield pooled.zf
+    finally:
+        with _ZIP_POOL_LOCK:
+            pooled.users -= 1
+            close = pooled.retired and pooled.users == 0
+        if close:
+            pooled.zf.close()
 
 
 # ---------------------------------------------------------------------------
 # CBZ / ZIP extraction
 # ---------------------------------------------------------------------------
 
+@functools.lru_cache(maxsize=512)
+def _list_cbz_pages_cached(key: tuple[str, int, int]) -> tuple[str, ...]:
+    """
+    Read and naturally sort the image entries of an archive, memoized
+    per file.
+
+    The key comes from :func:`_file_key`, so a modified archive gets a
+    fresh listing while repeat requests for the same chapter skip the
+    central-directory parse and sort entirely.
+
+    Args:
+        key: ``(path, mtime_ns, size)`` of the CBZ or ZIP file.
+
+    Returns:
+        Tuple of image filenames inside the archive, in page order.
+    """
+    # A private, short-lived handle: listing (e.g. every archive during
+    # a library scan) must not churn the readers' pooled handles.
+    with zipfile.ZipFile(key[0], "r") as z:
+        names = z.namelist()
+    return tuple(sorted(
+        (
+            name for name in names
+            if name.lower().endswith(IMAGE_EXT_TUPLE)
+            and not name.startswith("__MACOSX")
+        ),
+        key=lambda name: (_natural_key(name), name),
+    ))
+
+
+def _cbz_pages(cbz_path: str) -> tuple[str, ...]:
+    """Return the cached page listing for an archive (empty if missing)."""
+    key = _file_key(cbz_path)
+    if key is None:
+        return ()
+    return _list_cbz_pages_cached(key)
+
+
 def list_cbz_pages(cbz_path: str) -> list[str]:
     """
-    List sorted image entries inside a CBZ/ZIP archive.
+    List image entries inside a CBZ/ZIP archive in page order.
+
+    Entries are sorted naturally, so ``page10`` follows ``page9``.
 
     Args:
         cbz_path: Path to the CBZ or ZIP file.
 
     Returns:
-        Sorted list of image filenames inside the archive.
+        Naturally sorted list of image filenames inside the archive.
     """
-    with zipfile.ZipFile(cbz_path, "r") as z:
-        entries = [
-            name for name in z.namelist()
-            if is_image_file(name) and not name.startswith("__MACOSX")
-        ]
-    entries.sort()
-    return entries
+    return list(_cbz_pages(cbz_path))
 
 
 def extract_cbz_page(
@@ -85,12 +329,41 @@ def extract_cbz_page(
         Raw image bytes, or None if the entry doesn't exist.
     """
     try:
-        with zipfile.ZipFile(cbz_path, "r") as z:
+        with _leased_zip(cbz_path) as z:
             return z.read(page_name)
     except (KeyError, zipfile.BadZipFile):
         return None
 
 
+def extract_cbz_page_stream(
+    cbz_path: str,
+    page_name: str,
+    chunk_size: int = STREAM_CHUNK_SIZE,
+) -> Iterator[bytes]:
+    """
+    Stream a single image from a CBZ/ZIP in decompressed chunks.
+
+    Unlike :func:`extract_cbz_page` the whole image is never held in
+    memory, so the response can start before the entry is fully
+    decompressed.
+
+    Args:
+        cbz_path:   Path to the CBZ or ZIP file.
+        page_name:  Name of the image entry inside the archive.
+        chunk_size: Number of bytes per yielded chunk.
+
+    Yields:
+        Consecutive chunks of the image data.
+
+    Raises:
+        KeyError: If the entry doesn't exist (on first iteration).
+    """
+    # The lease is held until the stream is exhausted or closed
+    with _leased_zip(cbz_path) as z, z.open(page_name) as f:
+        while chunk := f.read(chunk_size):
+            yield chunk
+
+
 def extract_cbz_to_folder(
     cbz_path: str, dest_dir: Optional[str] = None
 ) -> str:
@@ -108,37 +381,98 @@ def extract_cbz_to_folder(
         dest_dir = tempfile.mkdtemp(prefix="comicviewer_")
 
     with zipfile.ZipFile(cbz_path, "r") as z:
-        for name in z.namelist():
-            if is_image_file(name) and not name.startswith("__MACOSX"):
-                z.extract(name, dest_dir)
+        for info in z.infolist():
+            if (
+                info.is_dir()
+                or info.filename.startswith("__MACOSX")
+                or not is_image_file(info.filename)
+            ):
+                continue
+            target = _member_target(dest_dir, info.filename)
+            if target is None:
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with z.open(info) as src, open(target, "wb") as dst:
+                shutil.copyfileobj(src, dst, EXTRACT_BUFFER_SIZE)
 
     return dest_dir
 
 
+def _member_target(dest_dir: str, member_name: str) -> Optional[str]:
+    """
+    Map an archive member name to a path inside *dest_dir*.
+
+    Drops drive letters, absolute prefixes and ``.``/``..`` components
+    the same way ``ZipFile.extract`` does, so a crafted archive can't
+    write outside the destination.
+
+    Returns:
+        The target path, or None if nothing is left of the name.
+    """
+    name = os.path.splitdrive(member_name.replace("\\", "/"))[1]
+    parts = [p for p in name.split("/") if p not in ("", ".", "..")]
+    if not parts:
+        return None
+    return os.path.join(dest_dir, *parts)
+
+
 # ---------------------------------------------------------------------------
 # Folder-of-images support
 # ---------------------------------------------------------------------------
 
 def list_folder_pages(folder_path: str) -> list[str]:
     """
-    List sorted image files in a directory (non-recursive).
+    List image files in a directory (non-recursive) in page order.
+
+    Uses ``os.scandir`` so file types come from the directory listing
+    itself instead of one ``stat`` per entry.  Names are sorted
+    naturally, matching :func:`list_cbz_pages`.
 
     Args:
         folder_path: Path to the image folder.
 
     Returns:
-        Sorted list of absolute paths to image files.
+        Naturally sorted list of absolute paths to image files.
     """
-    if not os.path.isdir(folder_path):
+    try:
+        it = os.scandir(folder_path)
+    except OSError:  # missing, or not a directory
         return []
+    with it:
+        images = [
+            entry for entry in it
+            if entry.name.lower().endswith(IMAGE_EXT_TUPLE)
+            and entry.is_file()
+        ]
+    images.sort(key=lambda entry: (_natural_key(entry.name), entry.name))
+    return [entry.path for entry in images]
+
+
+def count_folder_pages(folder_path: str) -> int:
+    """
+    Count the image files in a directory (non-recursive).
 
-    images = [
-        os.path.join(folder_path, f)
-        for f in os.listdir(folder_path)
-        if is_image_file(f)
-    ]
-    images.sort()
-    return images
+    Same filter as :func:`list_folder_pages` but without building or
+    sorting the path list.  File types come from the directory listing
+    (``d_type``), so no per-file ``stat`` is issued except for
+    symlinks.
+
+    Args:
+        folder_path: Path to the image folder.
+
+    Returns:
+        Number of image files found.
+    """
+    try:
+        it = os.scandir(folder_path)
+    except OSError:  # missing, or not a directory
+        return 0
+    with it:
+        return sum(
+            1 for entry in it
+            if entry.name.lower().endswith(IMAGE_EXT_TUPLE)
+            and entry.is_file()
+        )
 
 
 # ---------------------------------------------------------------------------
@@ -156,10 +490,49 @@ def get_page_count(chapter_path: str) -> int:
         Number of image pages found.
     """
     if is_cbz_file(chapter_path):
-        return len(list_cbz_pages(chapter_path))
-    elif os.path.isdir(chapter_path):
-        return len(list_folder_pages(chapter_path))
-    return 0
+        return len(_cbz_pages(chapter_path))
+    return count_folder_pages(chapter_path)
+
+
+def get_cbz_page_name(
+    cbz_path: str, page_number: int
+) -> Optional[str]:
+    """
+    Resolve a page number (0-indexed) to its entry name inside a CBZ.
+
+    Args:
+        cbz_path:    Path to the CBZ or ZIP file.
+        page_number: Zero-based page index.
+
+    Returns:
+        The archive entry name, or None if the page doesn't exist.
+    """
+    pages = _cbz_pages(cbz_path)
+    if 0 <= page_number < len(pages):
+        return pages[page_number]
+    return None
+
+
+def get_folder_page_path(
+    folder_path: str, page_number: int
+) -> Optional[str]:
+    """
+    Resolve a page number (0-indexed) to its file inside an image folder.
+
+    Lets callers stream the file straight from disk instead of loading
+    it into memory.
+
+    Args:
+        folder_path: Path to the image folder.
+        page_number: Zero-based page index.
+
+    Returns:
+        Absolute path to the page image, or None if it doesn't exist.
+    """
+    pages = list_folder_pages(folder_path)
+    if 0 <= page_number < len(pages):
+        return pages[page_number]
+    return None
 
 
 def get_page_image(
@@ -178,44 +551,239 @@ def get_page_image(
         Raw image bytes, or None if the page doesn't exist.
     """
     if is_cbz_file(chapter_path):
-        pages = list_cbz_pages(chapter_path)
-        if 0 <= page_number < len(pages):
-            return extract_cbz_page(chapter_path, pages[page_number])
-
-    elif os.path.isdir(chapter_path):
-        pages = list_folder_pages(chapter_path)
-        if 0 <= page_number < len(pages):
-            with open(pages[page_number], "rb") as f:
+        page_name = get_cbz_page_name(chapter_path, page_number)
+        if page_name is not None:
+            return extract_cbz_page(chapter_path, page_name)
+
+    else:
+        page_path = get_folder_page_path(chapter_path, page_number)
+        if page_path is not None:
+            with open(page_path, "rb") as f:
                 return f.read()
 
     return None
 
 
+# ---------------------------------------------------------------------------
+# Page prefetch cache
+# ---------------------------------------------------------------------------
+
+# (file key, entry name) -> (expiry time, image bytes), oldest first
+_PAGE_CACHE: "OrderedDict[tuple, tuple[float, bytes]]" = OrderedDict()
+_PAGE_CACHE_LOCK = threading.Lock()
+_page_cache_bytes = 0
+
+
+def _evict_pages(now: float) -> None:
+    """Drop expired pages, then the oldest ones beyond the size cap."""
+    global _page_cache_bytes
+    while _PAGE_CACHE:
+        key, (expires, data) = next(iter(_PAGE_CACHE.items()))
+        if expires > now and _page_cache_bytes <= PAGE_CACHE_MAX_BYTES:
+            break
+        del _PAGE_CACHE[key]
+        _page_cache_bytes -= len(data)
+
+
+def get_cached_cbz_page(cbz_path: str, page_name: str) -> Optional[bytes]:
+    """
+    Return a prefetched archive page if it is cached and still fresh.
+
+    Args:
+        cbz_path:  Path to the CBZ or ZIP file.
+        page_name: Name of the image entry inside the archive.
+
+    Returns:
+        The image bytes, or None on a cache miss.
+    """
+    key = _file_key(cbz_path)
+    if key is None:
+        return None
+    with _PAGE_CACHE_LOCK:
+        hit = _PAGE_CACHE.get((key, page_name))
+    if hit is None or hit[0] <= time.monotonic():
+        return None
+    return hit[1]
+
+
+def warm_cbz_page(cbz_path: str, page_number: int) -> None:
+    """
+    Decompress an archive page into the prefetch cache ahead of time.
+
+    Reading is almost always sequential, so the API calls this for the
+    page after the one it just served.  Missing pages, non-archives and
+    pages larger than the whole cache are silently ignored.
+
+    Args:
+        cbz_path:    Path to the CBZ or ZIP file.
+        page_number: Zero-based page index to prefetch.
+    """
+    global _page_cache_bytes
+    if not is_cbz_file(cbz_path):
+        return
+    page_name = get_cbz_page_name(cbz_path, page_number)
+    key = _file_key(cbz_path)
+    if page_name is None or key is None:
+        return
+    with _PAGE_CACHE_LOCK:
+        if (key, page_name) in _PAGE_CACHE:
+            return
+
+    data = extract_cbz_page(cbz_path, page_name)
+    if data is None or len(data) > PAGE_CACHE_MAX_BYTES:
+        return
+
+    now = time.monotonic()
+    with _PAGE_CACHE_LOCK:
+        if (key, page_name) in _PAGE_CACHE:
+            return
+        _PAGE_CACHE[(key, page_name)] = (now + PAGE_CACHE_TTL, data)
+        _page_cache_bytes += len(data)
+        _evict_pages(now)
+
+
+# ---------------------------------------------------------------------------
+# Thumbnails
+# ---------------------------------------------------------------------------
+
+def thumbnail_etag(
+    chapter_path: str,
+    page_number: int,
+    max_size: tuple[int, int] = (300, 400),
+) -> Optional[str]:
+    """
+    Compute a validator for a page thumbnail.
+
+    The tag hashes the source file's path, mtime and size together with
+    the page number and thumbnail size, so it changes whenever the
+    thumbnail would.  For image folders the page file itself is the
+    source; for archives it is the CBZ.
+
+    Args:
+        chapter_path: Path to a CBZ file or image folder.
+        page_number:  Zero-based page index.
+        max_size:     Maximum (width, height) for the thumbnail.
+
+    Returns:
+        Hex digest identifying the thumbnail, or None if the page
+        doesn't exist.
+    """
+    if is_cbz_file(chapter_path):
+        if not 0 <= page_number < len(_cbz_pages(chapter_path)):
+            return None
+        key = _file_key(chapter_path)
+    else:
+        page_path = get_folder_page_path(chapter_path, page_number)
+        key = _file_key(page_path) if page_path else None
+
+    if key is None:
+        return None
+    raw = repr((key, page_number, tuple(max_size))).encode()
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+def thumbnail_cache_path(etag: str) -> str:
+    """
+    Return where the thumbnail with this :func:`thumbnail_etag` is cached.
+
+    The file exists once the thumbnail has been rendered, so callers can
+    serve it straight from disk.
+    """
+    return os.path.join(THUMBNAIL_CACHE_DIR, etag[:2], f"{etag}.jpg")
+
+
+def _write_thumb_cache(cache_path: str, data: bytes) -> None:
+    """Atomically store a thumbnail; cache write failures are ignored."""
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # Don't leave a partial temp file behind (e.g. disk full)
+        if tmp_path is not None:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+
+def _thumbnail_vips(image_data: bytes, max_size: tuple[int, int]) -> bytes:
+    """Downscale and encode a thumbnail with libvips (shrink-on-load)."""
+    img = pyvips.Image.thumbnail_buffer(
+        image_data, max_size[0], height=max_size[1], size="down"
+    )
+    return img.jpegsave_buffer(Q=85, strip=True, optimize_coding=True)
+
+
+def _thumbnail_pillow(image_data: bytes, max_size: tuple[int, int]) -> bytes:
+    """Downscale and encode a thumbnail with Pillow."""
+    img = Image.open(BytesIO(image_data))
+    # JPEG only: have libjpeg scale by 1/2, 1/4 or 1/8 while decoding
+    # so Lanczos starts from roughly max_size instead of full size.
+    # Pillow ignores this for other formats.
+    img.draft("RGB", max_size)
+    img.thumbnail(max_size, Image.Resampling.LANCZOS)
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    buf = BytesIO()
+    img.save(buf, format="JPEG", quality=85)
+    return buf.getvalue()
+
+
 def get_page_thumbnail(
     chapter_path: str,
     page_number: int,
     max_size: tuple[int, int] = (300, 400),
+    etag: Optional[str] = None,
 ) -> Optional[bytes]:
     """
     Generate a thumbnail for a specific page.
 
+    Uses libvips when ``pyvips`` is installed and falls back to Pillow.
+    Results are cached in ``THUMBNAIL_CACHE_DIR`` keyed by
+    :func:`thumbnail_etag`, so each thumbnail is rendered only once
+    until its source changes.
+
     Args:
         chapter_path: Path to a CBZ file or image folder.
         page_number:  Zero-based page index.
         max_size:     Maximum (width, height) for the thumbnail.
+        etag:         The page's :func:`thumbnail_etag` if the caller
+                      already computed it (saves listing the archive
+                      again).
 
     Returns:
         JPEG bytes of the thumbnail, or None on failure.
     """
+    if etag is None:
+        etag = thumbnail_etag(chapter_path, page_number, max_size)
+        if etag is None:
+            return None
+    cache_path = thumbnail_cache_path(etag)
+    try:
+        with open(cache_path, "rb") as f:
+            return f.read()
+    except OSError:
+        pass
+
     image_data = get_page_image(chapter_path, page_number)
     if image_data is None:
         return None
 
-    try:
-        img = Image.open(BytesIO(image_data))
-        img.thumbnail(max_size, Image.Resampling.LANCZOS)
-        buf = BytesIO()
-        img.save(buf, format="JPEG", quality=85)
-        return buf.getvalue()
-    except Exception:
-        return None
+    thumb = None
+    if pyvips is not None:
+        try:
+            thumb = _thumbnail_vips(image_data, max_size)
+        except pyvips.Error:
+            thumb = None
+    if thumb is None:
+        try:
+            thumb = _thumbnail_pillow(image_data, max_size)
+        except Exception:
+            return None
+
+    _write_thumb_cache(cache_path, thumb)
+    return thumb
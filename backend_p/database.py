@@ -7,8 +7,10 @@ for sources, mangas, chapters, pages, and reading progress.
 
 import os
 import sqlite3
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Any, Optional
+from typing import Any, Iterable, Iterator, Optional
 
 
 # Default database path (relative to backend_p/)
@@ -17,6 +19,12 @@ DEFAULT_DB_PATH = os.path.join(
 )
 
 
+# Page cache (negative = KiB) for bulk writes such as library scans:
+# large enough that a big transaction's dirty pages aren't spilled to
+# the WAL before it commits.  Memory is only used as pages are touched.
+BULK_CACHE_SIZE = -256 * 1024
+
+
 # ---------------------------------------------------------------------------
 # Schema Definitions
 # ---------------------------------------------------------------------------
@@ -72,6 +80,30 @@ CREATE TABLE IF NOT EXISTS reading_progress (
     FOREIGN KEY (manga_id)  REFERENCES mangas(id)   ON DELETE CASCADE,
     FOREIGN KEY (chapter_id) REFERENCES chapters(id) ON DELETE CASCADE
 );
+
+-- Page counts of scanned chapter files/folders, reused while unchanged
+CREATE TABLE IF NOT EXISTS file_meta_cache (
+    path            TEXT    PRIMARY KEY,
+    mtime_ns        INTEGER NOT NULL,
+    size            INTEGER NOT NULL,
+    page_count      INTEGER NOT NULL
+);
+
+-- Manga directory mtimes from the last scan, to skip unchanged ones
+CREATE TABLE IF NOT EXISTS directory_scans (
+    path            TEXT    PRIMARY KEY,
+    mtime_ns        INTEGER NOT NULL
+);
+
+-- Lookup indexes; each also covers the ORDER BY of its query
+CREATE INDEX IF NOT EXISTS idx_mangas_source
+    ON mangas(source_id, title);
+CREATE INDEX IF NOT EXISTS idx_chapters_manga
+    ON chapters(manga_id, chapter_number, title);
+CREATE INDEX IF NOT EXISTS idx_pages_chapter
+    ON pages(chapter_id, page_number);
+CREATE INDEX IF NOT EXISTS idx_progress_last
+    ON reading_progress(last_read_at DESC);
 """
 
 
@@ -90,17 +122,97 @@ class DatabaseManager:
             db_path: Path to the SQLite database file.
         """
         self.db_path = db_path
+        self._tls = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
         self._init_db()
 
     # -- Connection helpers --------------------------------------------------
 
-    def _get_connection(self) -> sqlite3.Connection:
-        """Create and return a new database connection."""
-        conn = sqlite3.connect(self.db_path)
+    def _connect(self) -> sqlite3.Connection:
+        """Open and configure a new database connection."""
+        # Each connection is only used by the thread that opened it;
+        # check_same_thread is off so close() may run from any thread.
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
         conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA cache_size = -64000")
         conn.execute("PRAGMA foreign_keys = ON")
         return conn
 
+    def _get_connection(self) -> sqlite3.Connection:
+        """
+        Return this thread's connection, opening it on first use.
+
+        Connections are kept for the lifetime of the manager so point
+        lookups don't pay for connect + PRAGMA setup every time.
+        """
+        conn = getattr(self._tls, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._tls.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self) -> None:
+        """Close every connection opened by this manager."""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._tls = threading.local()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Group several writes into a single transaction.
+
+        Writes issued through this manager on the current thread inside
+        the block are committed once at the end (or rolled back on
+        error) instead of each committing on its own.  Nested blocks
+        join the outermost one.
+
+        Yields:
+            This thread's connection.
+        """
+        conn = self._get_connection()
+        depth = getattr(self._tls, "tx_depth", 0)
+        self._tls.tx_depth = depth + 1
+        try:
+            if depth:
+                yield conn
+            else:
+                with conn:
+                    yield conn
+        finally:
+            self._tls.tx_depth = depth
+
+    @contextmanager
+    def bulk_transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Like :meth:`transaction`, tuned for large batches of writes.
+
+        The connection's page cache is raised to ``BULK_CACHE_SIZE``
+        for the duration of the block and restored afterwards, even on
+        error (the connection is reused by later requests on this
+        thread).  Journal and sync settings are already WAL / NORMAL
+        for every connection.
+
+        Yields:
+            This thread's connection.
+        """
+        conn = self._get_connection()
+        previous = conn.execute("PRAGMA cache_size").fetchone()[0]
+        conn.execute(f"PRAGMA cache_size = {BULK_CACHE_SIZE}")
+        try:
+            with self.transaction() as tx_conn:
+                yield tx_conn
+        finally:
+            conn.execute(f"PRAGMA cache_size = {previous}")
+
     def _init_db(self) -> None:
         """Create tables if they don't exist."""
         with self._get_connection() as conn:
@@ -108,28 +220,35 @@ class DatabaseManager:
 
     # -- Generic helpers -----------------------------------------------------
 
-    def _fetchall(self, query: str, params: tuple = ()) -> list[dict]:
-        """Execute a SELECT and return all rows as dicts."""
-        with self._get_connection() as conn:
-            rows = conn.execute(query, params).fetchall()
-            return [dict(row) for row in rows]
+    def _fetchall(
+        self, query: str, params: tuple = ()
+    ) -> list[sqlite3.Row]:
+        """
+        Execute a SELECT and return all rows.
+
+        Rows are returned as ``sqlite3.Row`` (indexable by column name)
+        rather than copied into dicts; the API serializes them directly.
+        """
+        return self._get_connection().execute(query, params).fetchall()
 
     def _fetchone(
         self, query: str, params: tuple = ()
     ) -> Optional[dict]:
         """Execute a SELECT and return a single row as dict or None."""
-        with self._get_connection() as conn:
-            row = conn.execute(query, params).fetchone()
-            return dict(row) if row else None
+        row = self._get_connection().execute(query, params).fetchone()
+        return dict(row) if row else None
 
     def _execute(
         self, query: str, params: tuple = ()
     ) -> int:
-        """Execute an INSERT/UPDATE/DELETE and return lastrowid."""
-        with self._get_connection() as conn:
+        """
+        Execute an INSERT/UPDATE/DELETE and return lastrowid.
+
+        Commits immediately unless called inside :meth:`transaction`.
+        """
+        with self.transaction() as conn:
             cursor = conn.execute(query, params)
-            conn.commit()
-            return cursor.lastrowid
+        return cursor.lastrowid
 
     # -----------------------------------------------------------------------
     # Sources
@@ -154,7 +273,7 @@ class DatabaseManager:
             (name, path, source_type),
         )
 
-    def get_sources(self) -> list[dict]:
+    def get_sources(self) -> list[sqlite3.Row]:
         """Return all registered sources."""
         return self._fetchall("SELECT * FROM sources ORDER BY name")
 
@@ -192,7 +311,7 @@ class DatabaseManager:
             (title, author, description, cover_path, source_id, total_chapters),
         )
 
-    def get_mangas(self) -> list[dict]:
+    def get_mangas(self) -> list[sqlite3.Row]:
         """Return all mangas ordered by title."""
         return self._fetchall("SELECT * FROM mangas ORDER BY title")
 
@@ -200,7 +319,52 @@ class DatabaseManager:
         """Return a single manga by ID."""
         return self._fetchone("SELECT * FROM mangas WHERE id = ?", (manga_id,))
 
-    def get_mangas_by_source(self, source_id: int) -> list[dict]:
+    def get_manga_with_chapters(self, manga_id: int) -> Optional[dict]:
+        """
+        Return a manga with its chapters nested under ``"chapters"``.
+
+        Fetches both in a single ``LEFT JOIN`` query instead of one
+        query for the manga and another for its chapters.
+
+        Returns:
+            The manga dict with a ``chapters`` list ordered by number
+            and title, or None if the manga doesn't exist.
+        """
+        rows = self._get_connection().execute(
+            """SELECT m.*,
+                      c.id             AS c_id,
+                      c.chapter_number AS c_chapter_number,
+                      c.title          AS c_title,
+                      c.file_path      AS c_file_path,
+                      c.page_count     AS c_page_count,
+                      c.created_at     AS c_created_at
+               FROM mangas m
+               LEFT JOIN chapters c ON c.manga_id = m.id
+               WHERE m.id = ?
+               ORDER BY c.chapter_number, c.title""",
+            (manga_id,),
+        ).fetchall()
+        if not rows:
+            return None
+
+        first = rows[0]
+        manga = {k: first[k] for k in first.keys() if not k.startswith("c_")}
+        manga["chapters"] = [
+            {
+                "id": row["c_id"],
+                "manga_id": manga_id,
+                "chapter_number": row["c_chapter_number"],
+                "title": row["c_title"],
+                "file_path": row["c_file_path"],
+                "page_count": row["c_page_count"],
+                "created_at": row["c_created_at"],
+            }
+            for row in rows
+            if row["c_id"] is not None
+        ]
+        return manga
+
+    def get_mangas_by_source(self, source_id: int) -> list[sqlite3.Row]:
         """Return mangas belonging to a specific source."""
         return self._fetchall(
             "SELECT * FROM mangas WHERE source_id = ? ORDER BY title",
@@ -254,10 +418,97 @@ class DatabaseManager:
             (manga_id, chapter_number, title, file_path, page_count),
         )
 
-    def get_chapters(self, manga_id: int) -> list[dict]:
-        """Return all chapters for a manga, ordered by number."""
+    def add_chapters_bulk(
+        self,
+        manga_id: int,
+        rows: Iterable[tuple[float, str, str, int]],
+    ) -> int:
+        """
+        Insert many chapters of one manga with a single ``executemany``.
+
+        Rows may come in any order; readers get chapters sorted by
+        ``ORDER BY chapter_number, title`` (served by
+        ``idx_chapters_manga``).
+
+        Args:
+            manga_id: Owning manga ID.
+            rows:     ``(chapter_number, title, file_path, page_count)``
+                      tuples.
+
+        Returns:
+            Number of chapters inserted.
+        """
+        with self.transaction() as conn:
+            cursor = conn.executemany(
+                """INSERT INTO chapters
+                   (manga_id, chapter_number, title, file_path, page_count)
+                   VALUES (?, ?, ?, ?, ?)""",
+                ((manga_id, *row) for row in rows),
+            )
+        return cursor.rowcount
+
+    def sync_chapters(
+        self,
+        manga_id: int,
+        rows: Iterable[tuple[float, str, str, int]],
+    ) -> int:
+        """
+        Make a manga's chapters match *rows*, matching them by file path.
+
+        Chapters still on disk keep their ID (and with it any reading
+        progress pointing at them) and get their number, title and page
+        count refreshed; new ones are inserted and missing ones deleted.
+
+        Args:
+            manga_id: Owning manga ID.
+            rows:     ``(chapter_number, title, file_path, page_count)``
+                      tuples.
+
+        Returns:
+            Number of chapters the manga now has.
+        """
+        with self.transaction() as conn:
+            current = {
+                file_path: chapter_id
+                for chapter_id, file_path in conn.execute(
+                    "SELECT id, file_path FROM chapters WHERE manga_id = ?",
+                    (manga_id,),
+                )
+            }
+            updates = []
+            inserts = []
+            for number, title, file_path, page_count in rows:
+                chapter_id = current.pop(file_path, None)
+                if chapter_id is None:
+                    inserts.append(
+                        (manga_id, number, title, file_path, page_count)
+                    )
+                else:
+                    updates.append((number, title, page_count, chapter_id))
+
+            conn.executemany(
+                """UPDATE chapters
+                   SET chapter_number = ?, title = ?, page_count = ?
+                   WHERE id = ?""",
+                updates,
+            )
+            conn.executemany(
+                """INSERT INTO chapters
+                   (manga_id, chapter_number, title, file_path, page_count)
+                   VALUES (?, ?, ?, ?, ?)""",
+                inserts,
+            )
+            conn.executemany(
+                "DELETE FROM chapters WHERE id = ?",
+                [(chapter_id,) for chapter_id in current.values()],
+            )
+        return len(updates) + len(inserts)
+
+    def get_chapters(self, manga_id: int) -> list[sqlite3.Row]:
+        """Return all chapters for a manga, ordered by number, then title."""
         return self._fetchall(
-            "SELECT * FROM chapters WHERE manga_id = ? ORDER BY chapter_number",
+            """SELECT * FROM chapters WHERE manga_id = ?
+               ORDER BY chapter_number, title""",
             (manga_id,),
         )
 
@@ -267,6 +518,94 @@ class DatabaseManager:
             "SELECT * FROM chapters WHERE id = ?", (chapter_id,)
         )
 
+    # -----------------------------------------------------------------------
+    # Scan caches (file metadata, directory mtimes)
+    # -----------------------------------------------------------------------
+
+    def get_file_meta(
+        self, path_prefix: str
+    ) -> dict[str, tuple[int, int, int]]:
+        """
+        Load cached page counts for every path under a directory.
+
+        Args:
+            path_prefix: Directory path, ending with a separator.
+
+        Returns:
+            Mapping of path to ``(mtime_ns, size, page_count)``.
+        """
+        rows = self._get_connection().execute(
+            """SELECT path, mtime_ns, size, page_count
+               FROM file_meta_cache WHERE substr(path, 1, ?) = ?""",
+            (len(path_prefix), path_prefix),
+        )
+        return {row[0]: (row[1], row[2], row[3]) for row in rows}
+
+    def replace_file_meta(
+        self,
+        path_prefix: str,
+        rows: Iterable[tuple[str, int, int, int]],
+    ) -> None:
+        """
+        Replace the cached page counts under a directory.
+
+        Entries for paths that are no longer present are dropped.
+
+        Args:
+            path_prefix: Directory path, ending with a separator.
+            rows:        ``(path, mtime_ns, size, page_count)`` tuples.
+        """
+        with self.transaction() as conn:
+            conn.execute(
+                "DELETE FROM file_meta_cache WHERE substr(path, 1, ?) = ?",
+                (len(path_prefix), path_prefix),
+            )
+            conn.executemany(
+                """INSERT OR REPLACE INTO file_meta_cache
+                   (path, mtime_ns, size, page_count) VALUES (?, ?, ?, ?)""",
+                rows,
+            )
+
+    def get_directory_mtimes(self, path_prefix: str) -> dict[str, int]:
+        """
+        Load the recorded mtimes of every directory under a path.
+
+        Args:
+            path_prefix: Directory path, ending with a separator.
+
+        Returns:
+            Mapping of directory path to ``mtime_ns`` at the last scan.
+        """
+        rows = self._get_connection().execute(
+            """SELECT path, mtime_ns FROM directory_scans
+               WHERE substr(path, 1, ?) = ?""",
+            (len(path_prefix), path_prefix),
+        )
+        return {row[0]: row[1] for row in rows}
+
+    def replace_directory_mtimes(
+        self,
+        path_prefix: str,
+        rows: Iterable[tuple[str, int]],
+    ) -> None:
+        """
+        Replace the recorded directory mtimes under a path.
+
+        Args:
+            path_prefix: Directory path, ending with a separator.
+            rows:        ``(path, mtime_ns)`` tuples.
+        """
+        with self.transaction() as conn:
+            conn.execute(
+                "DELETE FROM directory_scans WHERE substr(path, 1, ?) = ?",
+                (len(path_prefix), path_prefix),
+            )
+            conn.executemany(
+                """INSERT OR REPLACE INTO directory_scans (path, mtime_ns)
+                   VALUES (?, ?)""",
+                rows,
+            )
+
     # -----------------------------------------------------------------------
     # Pages
     # -----------------------------------------------------------------------
@@ -286,7 +625,7 @@ class DatabaseManager:
             (chapter_id, page_number, file_path),
         )
 
-    def get_pages(self, chapter_id: int) -> list[dict]:
+    def get_pages(self, chapter_id: int) -> list[sqlite3.Row]:
         """Return all pages for a chapter, ordered by page number."""
         return self._fetchall(
             "SELECT * FROM pages WHERE chapter_id = ? ORDER BY page_number",
@@ -311,6 +650,9 @@ class DatabaseManager:
 
         Returns:
             The progress row ID.
+
+        Raises:
+            sqlite3.IntegrityError: If the manga or chapter doesn't exist.
         """
         return self._execute(
             """INSERT INTO reading_progress
@@ -332,7 +674,7 @@ class DatabaseManager:
             (manga_id,),
         )
 
-    def get_all_progress(self) -> list[dict]:
+    def get_all_progress(self) -> list[sqlite3.Row]:
         """Return all reading progress records."""
         return self._fetchall(
             "SELECT * FROM reading_progress ORDER BY last_read_at DESC"
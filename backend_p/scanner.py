@@ -6,25 +6,64 @@ Walks a source directory tree to identify manga folders and chapters
 the database.
 """
 
+import functools
 import os
 import re
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+from typing import Iterator, Optional
 
 from comic_parser import (
+    CBZ_EXTENSIONS,
+    IMAGE_EXT_TUPLE,
     IMAGE_EXTENSIONS,
+    count_folder_pages,
     get_page_count,
     is_cbz_file,
-    is_image_file,
 )
 from database import DatabaseManager
 
 
+# Default number of manga folders examined concurrently during a scan
+DEFAULT_MAX_CONCURRENT_SUBTASKS = (os.cpu_count() or 1) * 2
+
+# File stems (lowercase) that mark an image as the series cover
+COVER_NAMES = frozenset({"cover", "folder", "poster", "thumb", "thumbnail"})
+
+# Alternation of the known image extensions, without the dot
+_IMAGE_EXT_ALT = "|".join(
+    re.escape(ext.lstrip(".")) for ext in sorted(IMAGE_EXTENSIONS)
+)
+
+# An explicitly-named cover image, e.g. "Cover.JPG" or "folder.webp"
+_COVER_RE = re.compile(
+    r"(?:%s)\.(?:%s)" % ("|".join(sorted(COVER_NAMES)), _IMAGE_EXT_ALT),
+    re.I,
+)
+
+# "Chapter 12.5", "Ch.005", "c03" ...  \d also matches full-width
+# digits ("第１２話" releases often name files "１２.cbz"), which float()
+# understands.
+_CHAPTER_RE = re.compile(r"(?:ch(?:apter)?[\s._-]*)(\d+(?:\.\d+)?)", re.I)
+
+# Leading numeric portion, e.g. "001 - Title"
+_LEADING_NUMBER_RE = re.compile(r"(\d+(?:\.\d+)?)")
+
+# file_meta_cache page count for a .cbz/.zip that isn't a valid archive
+NOT_AN_ARCHIVE = -1
+
+# Chapter names repeat across mangas and rescans ("Chapter 01", "001")
+CHAPTER_NUMBER_CACHE_SIZE = 8192
+
+
+@functools.lru_cache(maxsize=CHAPTER_NUMBER_CACHE_SIZE)
 def _extract_chapter_number(name: str) -> float:
     """
     Attempt to extract a chapter number from a filename or folder name.
 
     Tries patterns like "Chapter 05", "Ch.12", "c003", or just a leading
     number.  Falls back to 0.0 if nothing recognizable is found.
+    Results are memoized, as the same names recur across mangas.
 
     Args:
         name: Filename or directory name (without path).
@@ -32,25 +71,17 @@ def _extract_chapter_number(name: str) -> float:
     Returns:
         Extracted chapter number as a float.
     """
-    # Try "Chapter 12.5", "Ch.005", "c03" patterns
-    match = re.search(r"(?:ch(?:apter)?[\s._-]*)(\d+(?:\.\d+)?)", name, re.I)
-    if match:
-        return float(match.group(1))
-
-    # Try leading numeric portion (e.g., "001 - Title")
-    match = re.match(r"(\d+(?:\.\d+)?)", name)
-    if match:
-        return float(match.group(1))
-
-    return 0.0
+    match = _CHAPTER_RE.search(name) or _LEADING_NUMBER_RE.match(name)
+    return float(match.group(1)) if match else 0.0
 
 
 def _find_cover(path: str) -> Optional[str]:
     """
     Find the best cover image in a directory.
 
-    Looks for files named 'cover', 'folder', or 'poster', then falls
-    back to the first image file found.
+    Prefers images named like ``COVER_NAMES`` ('cover', 'folder',
+    'poster', ...), then falls back to any image; ties go to the
+    alphabetically first name.
 
     Args:
         path: Directory to search.
@@ -58,30 +89,259 @@ def _find_cover(path: str) -> Optional[str]:
     Returns:
         Absolute path to the cover image, or None.
     """
-    if not os.path.isdir(path):
+    # Single pass, remembering the alphabetically first named cover and
+    # the alphabetically first image, so the pick doesn't depend on the
+    # filesystem's listing order.
+    # A named cover is one precompiled-regex call; any other image is
+    # one C-level endswith() over all extensions.
+    is_cover = _COVER_RE.fullmatch
+    first_cover: Optional[str] = None
+    first_cover_name = ""
+    first_image: Optional[str] = None
+    first_name = ""
+    try:
+        it = os.scandir(path)
+    except OSError:  # missing, or not a directory
         return None
+    with it:
+        for entry in it:
+            name = entry.name
+            if is_cover(name):
+                if first_cover is None or name < first_cover_name:
+                    first_cover, first_cover_name = entry.path, name
+            elif first_cover is None and name.lower().endswith(
+                IMAGE_EXT_TUPLE
+            ) and (first_image is None or name < first_name):
+                first_image, first_name = entry.path, name
+
+    return first_cover or first_image
+
+
+def _iter_chapters(
+    manga_dir: str,
+    meta_cache: dict[str, tuple[int, int, int]],
+    meta: list[tuple[str, int, int, int]],
+) -> Iterator[tuple[float, str, str, int]]:
+    """
+    Yield the chapters found directly inside a manga folder.
 
-    files = sorted(os.listdir(path))
-    cover_names = {"cover", "folder", "poster", "thumb", "thumbnail"}
+    Args:
+        manga_dir:  Path to the manga directory.
+        meta_cache: Page counts from earlier scans, as returned by
+                    ``DatabaseManager.get_file_meta``.
+        meta:       Receives a ``(path, mtime_ns, size, page_count)``
+                    row for every chapter candidate examined, including
+                    empty folders and invalid archives (page count
+                    ``NOT_AN_ARCHIVE``), for the file-metadata cache.
+
+    Yields:
+        ``(number, title, path, page_count)`` tuples in directory
+        (unspecified) order.
+
+    Raises:
+        OSError: If the folder (or a chapter's metadata) can't be read.
+    """
+    # Hot loop: one stat per candidate, everything it calls bound to
+    # locals, and the ready-made DirEntry.path / rfind() instead of
+    # os.path.join / splitext.
+    add_meta = meta.append
+    cached_meta = meta_cache.get
+    chapter_number = _extract_chapter_number
+
+    with os.scandir(manga_dir) as it:
+        for entry in it:
+            name = entry.name
+
+            # Subdirectory with images → chapter.  is_dir() comes from
+            # the directory listing, so this costs no stat().
+            if entry.is_dir():
+                is_folder = True
+                title = name
+
+            # CBZ / ZIP files → chapter.  The suffix test filters out
+            # everything else without touching the disk.
+            elif name.lower().endswith(CBZ_EXTENSIONS):
+                is_folder = False
+                dot = name.rfind(".")
+                title = name[:dot] if dot > 0 else name
+
+            else:
+                continue
+
+            entry_path = entry.path
+            try:
+                st = entry.stat()
+            except FileNotFoundError:  # dangling symlink, or just removed
+                continue
+            mtime_ns = st.st_mtime_ns
+            size = st.st_size
+
+            # Reuse the page count while the chapter is unchanged: a CBZ
+            # while its mtime and size match (it was also checked to be
+            # a zip then), a folder while its mtime matches (adding,
+            # removing or renaming a page bumps it).  Otherwise count
+            # afresh, sniffing archives first.
+            cached = cached_meta(entry_path)
+            if (
+                cached is not None
+                and cached[0] == mtime_ns
+                and cached[1] == size
+            ):
+                page_cnt = cached[2]
+            elif is_folder:
+                page_cnt = count_folder_pages(entry_path)
+            elif is_cbz_file(entry_path):
+                page_cnt = get_page_count(entry_path)
+            else:
+                page_cnt = NOT_AN_ARCHIVE
+            # Recorded even for non-archives, so a rescan notices when
+            # one becomes valid (e.g. it was still being copied)
+            add_meta((entry_path, mtime_ns, size, page_cnt))
 
-    # Priority: explicitly-named cover files
-    for f in files:
-        stem, ext = os.path.splitext(f)
-        if stem.lower() in cover_names and ext.lower() in IMAGE_EXTENSIONS:
-            return os.path.join(path, f)
+            # Classification done: only surviving chapters pay for the
+            # chapter-number regexes.
+            if page_cnt == NOT_AN_ARCHIVE or (is_folder and page_cnt <= 0):
+                continue
+            yield (chapter_number(name), title, entry_path, page_cnt)
 
-    # Fallback: first image file
-    for f in files:
-        if is_image_file(f):
-            return os.path.join(path, f)
 
+def _stored_cover(manga_dir: str, cover: Optional[str]) -> Optional[str]:
+    """
+    Return the cover recorded by the last scan if it can be kept as is.
+
+    Only an explicitly-named cover directly inside *manga_dir* that is
+    still on disk qualifies: short of a second named cover added next
+    to it, it is what :func:`_find_cover` would pick again, at the
+    price of one stat instead of a directory listing.  A fallback
+    (first image) cover is not reused, since a named cover may have
+    been added since.
+    """
+    if (
+        cover
+        and os.path.dirname(cover) == manga_dir
+        and _COVER_RE.fullmatch(os.path.basename(cover))
+        and os.path.isfile(cover)
+    ):
+        return cover
     return None
 
 
+def _discover_chapters(
+    manga_dir: str,
+    meta_cache: dict[str, tuple[int, int, int]],
+    stored_cover: Optional[str] = None,
+) -> tuple[
+    list[tuple[float, str, str, int]],
+    Optional[str],
+    list[tuple[str, int, int, int]],
+]:
+    """
+    Find the chapters and cover image of one manga folder.
+
+    Only touches the filesystem, never the database, so several manga
+    folders can be examined concurrently.  The chapters are collected
+    into a list here because the result is handed back from a worker
+    thread and written later, in the scan's single transaction.
+
+    Args:
+        manga_dir:    Path to the manga directory.
+        meta_cache:   Page counts from earlier scans, as returned by
+                      ``DatabaseManager.get_file_meta``.
+        stored_cover: Cover path recorded by the last scan, reused
+                      (see :func:`_stored_cover`) instead of searching
+                      the folder again.
+
+    Returns:
+        ``(chapters, cover, meta)`` where *chapters* is a list of
+        ``(number, title, path, page_count)`` tuples in unspecified
+        order, *cover* is the cover image path (None if there is no
+        cover or no chapters) and *meta* holds the file-metadata rows
+        to cache.
+
+    Raises:
+        OSError: If the folder can't be read.
+    """
+    meta: list[tuple[str, int, int, int]] = []
+    chapters_found = list(_iter_chapters(manga_dir, meta_cache, meta))
+    if not chapters_found:
+        return chapters_found, None, meta
+
+    # Chapters are left in directory order: the database sorts them
+    # by (chapter_number, title) when they are read back.
+    cover = _stored_cover(manga_dir, stored_cover) or _find_cover(manga_dir)
+    return chapters_found, cover, meta
+
+
+def _chapters_unchanged(
+    chapter_paths: list[str],
+    meta_cache: dict[str, tuple[int, int, int]],
+) -> bool:
+    """
+    Check whether every chapter recorded for a manga is untouched.
+
+    Used once the manga directory's own mtime matches the last scan
+    (so no chapter was added, removed or renamed); this catches the
+    changes that don't bump it: pages added to a chapter folder, or an
+    archive rewritten in place.  One stat per chapter, no listings.
+    """
+    for path in chapter_paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        if meta_cache[path][:2] != (st.st_mtime_ns, st.st_size):
+            return False
+    return True
+
+
+def _scan_manga_dir(
+    entry: os.DirEntry,
+    stored_mtime: Optional[int],
+    stored_cover: Optional[str],
+    chapter_paths: list[str],
+    meta_cache: dict[str, tuple[int, int, int]],
+) -> tuple[Optional[int], Optional[tuple]]:
+    """
+    Examine one manga folder, skipping it if unchanged since last scan.
+
+    An unchanged folder keeps its recorded cover without any lookup.
+    A folder that can't be read (removed since the source was listed,
+    permission or I/O errors) is reported rather than raised, so one
+    bad folder doesn't abort the whole scan.
+
+    Args:
+        entry:         DirEntry of the manga folder.
+        stored_mtime:  Folder mtime recorded by the last scan, or None
+                       to force discovery (new manga).
+        stored_cover:  Cover path recorded by the last scan, if any.
+        chapter_paths: Chapter paths recorded under the folder.
+        meta_cache:    Page counts from earlier scans.
+
+    Returns:
+        ``(mtime_ns, discovered)`` where *discovered* is the result of
+        :func:`_discover_chapters`, or None if nothing changed.  Both
+        are None if the folder couldn't be read.
+    """
+    try:
+        # Taken before listing, so changes made mid-scan show up next
+        # time
+        mtime_ns = entry.stat().st_mtime_ns
+        if mtime_ns == stored_mtime and _chapters_unchanged(
+            chapter_paths, meta_cache
+        ):
+            return mtime_ns, None
+        return mtime_ns, _discover_chapters(
+            entry.path, meta_cache, stored_cover
+        )
+    except OSError:
+        return None, None
+
+
 def scan_source(
     db: DatabaseManager,
     source_id: int,
     source_path: str,
+    max_concurrent_subtasks: Optional[int] = None,
 ) -> dict:
     """
     Scan a source directory to discover mangas and chapters.
@@ -105,77 +365,160 @@ def scan_source(
     Within each manga directory, CBZ files and image-containing
     subdirectories are treated as chapters.
 
+    Manga folders are examined concurrently on a thread pool (the work
+    is I/O-bound and releases the GIL); the results are then written
+    to the database from this thread in a single transaction.  Page
+    counts of chapters unchanged since the last scan come from the
+    ``file_meta_cache`` table instead of reopening each archive.
+
+    Rescans are incremental: a manga already in the database whose
+    folder mtime and chapter stats all match the last scan is skipped
+    outright.  Changed mangas have their chapters synced in place
+    (keeping chapter IDs and reading progress), and mangas whose folder
+    is gone or no longer holds chapters are removed.  Folders that
+    can't be read are left as registered, and nothing is removed when
+    the source lists no folders at all (e.g. an unmounted share).
+
     Args:
         db:          DatabaseManager instance.
         source_id:   ID of the source record in the DB.
         source_path: Absolute path to the source directory.
+        max_concurrent_subtasks: Number of manga folders examined in
+                     parallel.  Defaults to
+                     ``DEFAULT_MAX_CONCURRENT_SUBTASKS``.
 
     Returns:
         Summary dict with counts: ``{"mangas": int, "chapters": int}``.
     """
-    if not os.path.isdir(source_path):
+    # Each immediate child directory = one manga.  os.scandir yields
+    # DirEntry objects whose is_dir() answers from the directory listing
+    # itself, saving a stat() per entry.
+    # Registration order doesn't matter (the DB assigns IDs and queries
+    # sort by title), so the listing isn't sorted.
+    try:
+        it = os.scandir(source_path)
+    except OSError:  # missing, or not a directory
         return {"mangas": 0, "chapters": 0}
+    with it:
+        manga_entries = [entry for entry in it if entry.is_dir()]
 
     manga_count = 0
     chapter_count = 0
 
-    # Each immediate child directory = one manga
-    for manga_name in sorted(os.listdir(source_path)):
-        manga_dir = os.path.join(source_path, manga_name)
-        if not os.path.isdir(manga_dir):
-            continue
-
-        # Discover chapters inside this manga folder
-        chapters_found: list[dict] = []
-
-        for entry in sorted(os.listdir(manga_dir)):
-            entry_path = os.path.join(manga_dir, entry)
-
-            # CBZ / ZIP files → chapter
-            if is_cbz_file(entry_path):
-                chapters_found.append({
-                    "number": _extract_chapter_number(entry),
-                    "title": os.path.splitext(entry)[0],
-                    "path": entry_path,
-                    "page_count": get_page_count(entry_path),
-                })
-
-            # Subdirectory with images → chapter
-            elif os.path.isdir(entry_path):
-                page_cnt = get_page_count(entry_path)
-                if page_cnt > 0:
-                    chapters_found.append({
-                        "number": _extract_chapter_number(entry),
-                        "title": entry,
-                        "path": entry_path,
-                        "page_count": page_cnt,
-                    })
-
-        # Skip directories with no discoverable chapters
-        if not chapters_found:
-            continue
-
-        # Find a cover image
-        cover = _find_cover(manga_dir)
-
-        # Register manga in the database
-        manga_id = db.add_manga(
-            title=manga_name,
-            source_id=source_id,
-            cover_path=cover or "",
-            total_chapters=len(chapters_found),
+    # State left by the previous scan, loaded in a few queries:
+    # page counts, folder mtimes and the mangas registered by title
+    # (the oldest row wins if earlier scans registered duplicates).
+    path_prefix = os.path.join(source_path, "")
+    meta_cache = db.get_file_meta(path_prefix)
+    dir_mtimes = db.get_directory_mtimes(path_prefix)
+    existing: dict[str, dict] = {}
+    stale_ids: set[int] = set()
+    for row in db.get_mangas_by_source(source_id):
+        stale_ids.add(row["id"])
+        known = existing.get(row["title"])
+        if known is None or row["id"] < known["id"]:
+            existing[row["title"]] = dict(row)
+
+    chapter_paths: dict[str, list[str]] = {}
+    for path in meta_cache:
+        chapter_paths.setdefault(os.path.dirname(path), []).append(path)
+
+    # Only mangas already registered may be skipped as unchanged or
+    # keep their cover
+    registered = [existing.get(entry.name) for entry in manga_entries]
+    stored_mtimes = [
+        dir_mtimes.get(entry.path) if manga is not None else None
+        for entry, manga in zip(manga_entries, registered)
+    ]
+    stored_covers = [
+        manga["cover_path"] if manga is not None else None
+        for manga in registered
+    ]
+
+    # Filesystem discovery in parallel ...
+    workers = max_concurrent_subtasks or DEFAULT_MAX_CONCURRENT_SUBTASKS
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        scanned = list(pool.map(
+            _scan_manga_dir,
+            manga_entries,
+            stored_mtimes,
+            stored_covers,
+            [chapter_paths.get(entry.path, []) for entry in manga_entries],
+            repeat(meta_cache),
+        ))
+
+    # Chapter metadata to keep: fresh rows for rescanned folders, the
+    # cached rows for skipped or unreadable ones.  Both this and the
+    # directory rows are generated while the DB consumes them rather
+    # than copied into one more source-wide list.
+    def meta_rows() -> Iterator[tuple[str, int, int, int]]:
+        for entry, (_, discovered) in zip(manga_entries, scanned):
+            if discovered is not None:
+                yield from discovered[2]
+            else:
+                for path in chapter_paths.get(entry.path, []):
+                    yield (path, *meta_cache[path])
+
+    # ... then a single-threaded DB pass, committed once at the end
+    with db.bulk_transaction():
+        db.replace_file_meta(path_prefix, meta_rows())
+        db.replace_directory_mtimes(
+            path_prefix,
+            (
+                (entry.path, mtime_ns)
+                for entry, (mtime_ns, _) in zip(manga_entries, scanned)
+                if mtime_ns is not None
+            ),
         )
-        manga_count += 1
-
-        # Register each chapter
-        for ch in chapters_found:
-            db.add_chapter(
-                manga_id=manga_id,
-                chapter_number=ch["number"],
-                file_path=ch["path"],
-                title=ch["title"],
-                page_count=ch["page_count"],
-            )
-            chapter_count += 1
+
+        for manga_entry, (_, discovered) in zip(manga_entries, scanned):
+            manga = existing.get(manga_entry.name)
+
+            # Unchanged since the last scan, or unreadable this time
+            # (kept as registered, and retried next scan): nothing to
+            # write
+            if discovered is None:
+                if manga is None:
+                    continue
+                stale_ids.discard(manga["id"])
+                manga_count += 1
+                chapter_count += manga["total_chapters"]
+                continue
+
+            # Skip directories with no discoverable chapters
+            chapters_found, cover, _ = discovered
+            if not chapters_found:
+                continue
+
+            if manga is None:
+                # New manga: register it and all its chapters with one
+                # executemany
+                manga_id = db.add_manga(
+                    title=manga_entry.name,
+                    source_id=source_id,
+                    cover_path=cover or "",
+                    total_chapters=len(chapters_found),
+                )
+                chapter_count += db.add_chapters_bulk(
+                    manga_id, chapters_found
+                )
+            else:
+                stale_ids.discard(manga["id"])
+                db.update_manga(
+                    manga["id"],
+                    cover_path=cover or "",
+                    total_chapters=len(chapters_found),
+                )
+                chapter_count += db.sync_chapters(
+                    manga["id"], chapters_found
+                )
+            manga_count += 1
+
+        # Folders that are gone, emptied, or duplicate registrations.
+        # An empty listing is far more likely an unmounted share than
+        # a library emptied on purpose, so nothing is pruned then.
+        if manga_entries:
+            for manga_id in stale_ids:
+                db.delete_manga(manga_id)
 
     return {"mangas": manga_count, "chapters": chapter_count}
@@ -0,0 +1,144 @@
+"""Tests for comic_parser: the ZipFile handle pool and extraction."""
+
+import os
+import zipfile
+
+import pytest
+
+import comic_parser
+from comic_parser import _leased_zip, extract_cbz_to_folder
+
+
+def _write_cbz(path, content=b"page"):
+    with zipfile.ZipFile(path, "w") as z:
+        z.writestr("page0.jpg", content)
+
+
+def _bump_mtime(path):
+    """Move a path's mtime forward, whatever the filesystem resolution."""
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+
+@pytest.fixture(autouse=True)
+def zip_pool(monkeypatch):
+    """Empty single-slot pool, so a second archive evicts the first."""
+    monkeypatch.setattr(comic_parser, "ZIP_POOL_SIZE", 1)
+    comic_parser._ZIP_POOL.clear()
+    yield comic_parser._ZIP_POOL
+    for pooled in comic_parser._ZIP_POOL.values():
+        pooled.zf.close()
+    comic_parser._ZIP_POOL.clear()
+
+
+def _is_closed(zf):
+    return zf.fp is None
+
+
+def test_lease_reuses_pooled_handle(tmp_path, zip_pool):
+    path = str(tmp_path / "a.cbz")
+    _write_cbz(path)
+
+    with _leased_zip(path) as first:
+        pass
+    with _leased_zip(path) as second:
+        assert second.read("page0.jpg") == b"page"
+
+    assert second is first
+    assert not _is_closed(first)
+    assert zip_pool[path].users == 0
+
+
+def test_eviction_waits_for_lease(tmp_path, zip_pool):
+    a, b = str(tmp_path / "a.cbz"), str(tmp_path / "b.cbz")
+    _write_cbz(a)
+    _write_cbz(b)
+
+    with _leased_zip(a) as held:
+        with _leased_zip(b):
+            pass
+        # Evicted from the pool, but still open for the current reader
+        assert list(zip_pool) == [b]
+        assert not _is_closed(held)
+        assert held.read("page0.jpg") == b"page"
+    assert _is_closed(held)
+
+
+def test_evicted_idle_handle_is_closed(tmp_path, zip_pool):
+    a, b = str(tmp_path / "a.cbz"), str(tmp_path / "b.cbz")
+    _write_cbz(a)
+    _write_cbz(b)
+
+    with _leased_zip(a) as first:
+        pass
+    with _leased_zip(b):
+        assert _is_closed(first)
+
+
+def test_reopen_after_mtime_change(tmp_path, zip_pool):
+    path = str(tmp_path / "a.cbz")
+    _write_cbz(path, b"old")
+    with _leased_zip(path) as old:
+        assert old.read("page0.jpg") == b"old"
+
+    _write_cbz(path, b"new")
+    _bump_mtime(path)
+    with _leased_zip(path) as new:
+        assert new.read("page0.jpg") == b"new"
+
+    assert new is not old
+    assert _is_closed(old)
+    assert zip_pool[path].zf is new
+
+
+def test_concurrent_open_keeps_first_pooled(tmp_path, zip_pool, monkeypatch):
+    path = str(tmp_path / "a.cbz")
+    _write_cbz(path)
+    real_zipfile = zipfile.ZipFile
+    opened = []
+
+    def racing_zipfile(*args, **kwargs):
+        # While this open is in flight (outside the pool lock), another
+        # reader opens and pools the same archive first.
+        zf = real_zipfile(*args, **kwargs)
+        opened.append(zf)
+        if len(opened) == 1:
+            with _leased_zip(path):
+                pass
+        return zf
+
+    monkeypatch.setattr(comic_parser.zipfile, "ZipFile", racing_zipfile)
+    with _leased_zip(path) as leased:
+        assert leased.read("page0.jpg") == b"page"
+
+    duplicate, winner = opened
+    assert leased is winner
+    assert _is_closed(duplicate)
+    assert not _is_closed(winner)
+    assert zip_pool[path].zf is winner
+    assert zip_pool[path].users == 0
+
+
+def test_extract_keeps_members_inside_dest(tmp_path):
+    cbz = str(tmp_path / "evil.cbz")
+    with zipfile.ZipFile(cbz, "w") as z:
+        for name in ("../../x.jpg", "/abs.jpg", "a/../b.jpg", "sub\\win.jpg"):
+            z.writestr(name, b"page")
+    dest = tmp_path / "out" / "dest"
+    os.makedirs(dest)
+
+    extract_cbz_to_folder(cbz, str(dest))
+
+    # Nothing escapes dest: each name is reduced to its safe components
+    written = sorted(
+        os.path.relpath(os.path.join(root, name), tmp_path)
+        for root, _, files in os.walk(tmp_path)
+        for name in files
+        if name != "evil.cbz"
+    )
+    assert written == sorted(
+        os.path.join("out", "dest", *parts)
+        for parts in (
+            ["x.jpg"], ["abs.jpg"], ["a", "b.jpg"], ["sub", "win.jpg"],
+        )
+    )
@@ -0,0 +1,281 @@
+"""Tests for scanner.scan_source: initial scans and incremental rescans."""
+
+import os
+import shutil
+import zipfile
+
+import pytest
+
+import scanner
+from database import DatabaseManager
+from scanner import scan_source
+
+
+def _write_cbz(path, pages=3):
+    with zipfile.ZipFile(path, "w") as z:
+        for i in range(pages):
+            z.writestr(f"page{i}.jpg", b"\xff\xd8\xff" + bytes(16))
+
+
+def _write_folder(path, pages=3):
+    os.makedirs(path)
+    for i in range(pages):
+        with open(os.path.join(path, f"p{i}.png"), "wb") as f:
+            f.write(b"\x89PNG" + bytes(16))
+
+
+def _bump_mtime(path):
+    """Move a path's mtime forward, whatever the filesystem resolution."""
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+
+@pytest.fixture
+def library(tmp_path):
+    """Source with one CBZ manga and one image-folder manga."""
+    root = tmp_path / "library"
+    manga_a = root / "Manga A"
+    os.makedirs(manga_a)
+    _write_cbz(manga_a / "Chapter 01.cbz")
+    _write_cbz(manga_a / "Chapter 02.cbz", pages=4)
+    (manga_a / "cover.jpg").write_bytes(b"\xff\xd8\xff")
+    (manga_a / "notes.txt").write_text("not a chapter")
+    _write_folder(str(root / "Manga B" / "001"))
+    _write_folder(str(root / "Manga B" / "002"), pages=2)
+    return str(root)
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / "test.db"))
+    yield manager
+    manager.close()
+
+
+@pytest.fixture
+def source_id(db, library):
+    return db.add_source("Library", library)
+
+
+def _snapshot(db):
+    """{title: [(chapter id, title, page count), ...]} in reading order."""
+    return {
+        manga["title"]: [
+            (c["id"], c["title"], c["page_count"])
+            for c in db.get_chapters(manga["id"])
+        ]
+        for manga in db.get_mangas()
+    }
+
+
+def _manga(db, title):
+    return next(m for m in db.get_mangas() if m["title"] == title)
+
+
+@pytest.mark.parametrize("name, number", [
+    ("Chapter 05", 5.0),
+    ("Ch.12.5", 12.5),
+    ("001 - Title", 1.0),
+    ("１２.cbz", 12.0),
+    ("Extras", 0.0),
+])
+def test_extract_chapter_number(name, number):
+    assert scanner._extract_chapter_number(name) == number
+
+
+@pytest.mark.parametrize("names, expected", [
+    (["folder.jpg", "cover.jpg", "a.png"], "cover.jpg"),
+    (["poster.webp", "folder.png"], "folder.png"),
+    (["b.png", "a.jpg", "notes.txt"], "a.jpg"),
+    (["notes.txt"], None),
+])
+def test_find_cover(tmp_path, names, expected):
+    for name in names:
+        (tmp_path / name).write_bytes(b"")
+
+    cover = scanner._find_cover(str(tmp_path))
+
+    assert cover == (str(tmp_path / expected) if expected else None)
+
+
+def test_initial_scan(db, library, source_id):
+    result = scan_source(db, source_id, library)
+
+    assert result == {"mangas": 2, "chapters": 4}
+    chapters = _snapshot(db)
+    assert [(t, n) for _, t, n in chapters["Manga A"]] == [
+        ("Chapter 01", 3), ("Chapter 02", 4),
+    ]
+    assert [(t, n) for _, t, n in chapters["Manga B"]] == [
+        ("001", 3), ("002", 2),
+    ]
+    assert _manga(db, "Manga A")["cover_path"] == os.path.join(
+        library, "Manga A", "cover.jpg"
+    )
+
+
+def test_rescan_is_idempotent(db, library, source_id):
+    scan_source(db, source_id, library)
+    before = _snapshot(db)
+
+    result = scan_source(db, source_id, library)
+
+    assert result == {"mangas": 2, "chapters": 4}
+    assert _snapshot(db) == before
+    assert len(db.get_mangas()) == 2
+
+
+def test_rescan_skips_unchanged_folders(
+    db, library, source_id, monkeypatch
+):
+    scan_source(db, source_id, library)
+    calls = []
+    discover = scanner._discover_chapters
+    monkeypatch.setattr(
+        scanner, "_discover_chapters",
+        lambda path, *args: calls.append(path) or discover(path, *args),
+    )
+
+    scan_source(db, source_id, library)
+
+    assert calls == []
+
+
+def test_added_chapter_keeps_ids_and_progress(db, library, source_id):
+    scan_source(db, source_id, library)
+    manga = _manga(db, "Manga A")
+    first = db.get_chapters(manga["id"])[0]
+    db.upsert_progress(manga["id"], first["id"], current_page=2)
+    before = _snapshot(db)["Manga A"]
+
+    _write_cbz(os.path.join(library, "Manga A", "Chapter 03.cbz"))
+    _bump_mtime(os.path.join(library, "Manga A"))
+    result = scan_source(db, source_id, library)
+
+    assert result == {"mangas": 2, "chapters": 5}
+    after = _snapshot(db)["Manga A"]
+    assert after[:2] == before
+    assert after[2][1:] == ("Chapter 03", 3)
+    assert _manga(db, "Manga A")["total_chapters"] == 3
+    progress = db.get_progress(manga["id"])
+    assert progress["chapter_id"] == first["id"]
+    assert progress["current_page"] == 2
+
+
+def test_page_added_to_chapter_folder(db, library, source_id):
+    scan_source(db, source_id, library)
+
+    chapter_dir = os.path.join(library, "Manga B", "002")
+    shutil.copy(
+        os.path.join(chapter_dir, "p0.png"),
+        os.path.join(chapter_dir, "p9.png"),
+    )
+    _bump_mtime(chapter_dir)
+    scan_source(db, source_id, library)
+
+    assert [n for _, _, n in _snapshot(db)["Manga B"]] == [3, 3]
+
+
+def test_archive_completed_after_scan(db, library, source_id):
+    # An archive still being copied has no central directory yet
+    manga_dir = os.path.join(library, "Manga A")
+    partial = os.path.join(manga_dir, "Chapter 03.cbz")
+    with open(partial, "wb") as f:
+        f.write(b"PK\x03\x04 not finished")
+    scan_source(db, source_id, library)
+    assert len(_snapshot(db)["Manga A"]) == 2
+
+    # The copy completes in place: the folder's mtime doesn't change
+    folder_times = os.stat(manga_dir)
+    _write_cbz(partial)
+    _bump_mtime(partial)
+    os.utime(
+        manga_dir,
+        ns=(folder_times.st_atime_ns, folder_times.st_mtime_ns),
+    )
+    result = scan_source(db, source_id, library)
+
+    assert result["chapters"] == 5
+    assert [t for _, t, _ in _snapshot(db)["Manga A"]] == [
+        "Chapter 01", "Chapter 02", "Chapter 03",
+    ]
+
+
+def test_removed_chapter_is_dropped(db, library, source_id):
+    scan_source(db, source_id, library)
+
+    os.remove(os.path.join(library, "Manga A", "Chapter 02.cbz"))
+    _bump_mtime(os.path.join(library, "Manga A"))
+    scan_source(db, source_id, library)
+
+    assert [t for _, t, _ in _snapshot(db)["Manga A"]] == ["Chapter 01"]
+
+
+def test_removed_folder_is_pruned(db, library, source_id):
+    scan_source(db, source_id, library)
+    kept = _manga(db, "Manga A")
+    db.upsert_progress(
+        kept["id"], db.get_chapters(kept["id"])[0]["id"], current_page=1
+    )
+
+    shutil.rmtree(os.path.join(library, "Manga B"))
+    result = scan_source(db, source_id, library)
+
+    assert result == {"mangas": 1, "chapters": 2}
+    assert [m["title"] for m in db.get_mangas()] == ["Manga A"]
+    assert db.get_progress(kept["id"]) is not None
+
+
+def test_empty_source_prunes_nothing(db, library, source_id):
+    scan_source(db, source_id, library)
+    before = _snapshot(db)
+
+    # What an unmounted share looks like: the mount point, empty
+    for name in os.listdir(library):
+        shutil.rmtree(os.path.join(library, name))
+    scan_source(db, source_id, library)
+
+    assert _snapshot(db) == before
+
+
+def test_unreadable_folder_is_kept(db, library, source_id, monkeypatch):
+    scan_source(db, source_id, library)
+    manga = _manga(db, "Manga B")
+    db.upsert_progress(
+        manga["id"], db.get_chapters(manga["id"])[0]["id"], current_page=1
+    )
+    before = _snapshot(db)
+
+    manga_dir = os.path.join(library, "Manga B")
+    _bump_mtime(manga_dir)
+    discover = scanner._discover_chapters
+
+    def failing_discover(path, *args):
+        if path == manga_dir:
+            raise PermissionError(13, "Permission denied", path)
+        return discover(path, *args)
+
+    monkeypatch.setattr(scanner, "_discover_chapters", failing_discover)
+    scan_source(db, source_id, library)
+
+    assert _snapshot(db) == before
+    assert db.get_progress(manga["id"]) is not None
+
+    # Once readable again the folder is rescanned, not skipped
+    calls = []
+    monkeypatch.setattr(
+        scanner, "_discover_chapters",
+        lambda path, *args: calls.append(path) or discover(path, *args),
+    )
+    scan_source(db, source_id, library)
+    assert calls == [manga_dir]
+
+
+def test_folder_removed_after_listing_does_not_abort(library):
+    with os.scandir(library) as it:
+        entry = next(e for e in it if e.name == "Manga B")
+    shutil.rmtree(entry.path)
+
+    assert scanner._scan_manga_dir(entry, None, None, [], {}) == (
+        None, None,
+    )